@@ -37,19 +37,24 @@ def fetch_markets(chain: str, base_url: Optional[str] = None) -> Dict[str, int]:
     return decimals_map
 
 
-def fetch_markets_meta(chain: str, base_url: Optional[str] = None) -> Tuple[Dict[str, int], Dict[str, str]]:
-    """Fetch markets and return (decimals_map, name_map).
-
-    name_map prefers 'symbol' if available, else 'name', else the checksummed address.
-    """
+def fetch_markets_reserves(chain: str, base_url: Optional[str] = None) -> List[dict]:
+    """Fetch the raw reserve entries from /data/markets (underlyingAsset, decimals, symbol, flags...)."""
     base = base_url or _base_url()
     url = f"{base}/data/markets"
     resp = requests.get(url, params={"chain": chain}, timeout=20)
     resp.raise_for_status()
     data = resp.json() or {}
+    return data.get("reserves", [])
+
+
+def fetch_markets_meta(chain: str, base_url: Optional[str] = None) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """Fetch markets and return (decimals_map, name_map).
+
+    name_map prefers 'symbol' if available, else 'name', else the checksummed address.
+    """
     decimals_map: Dict[str, int] = {}
     name_map: Dict[str, str] = {}
-    for r in data.get("reserves", []):
+    for r in fetch_markets_reserves(chain, base_url):
         ua_raw = r.get("underlyingAsset")
         if not ua_raw:
             continue
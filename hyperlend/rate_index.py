@@ -0,0 +1,499 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+
+from .loan import (
+    SECONDS_PER_YEAR,
+    _base_url,
+    fetch_interest_rate_history,
+    fetch_markets_reserves,
+    ray_to_percent,
+    to_checksum_address,
+)
+
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+WEEK_OFFSET = 4 * DAY  # 1970-01-05 (first Monday after the epoch), so weeks start Monday 00:00 UTC
+
+SIDES = ("borrow", "supply")
+RATE_FIELDS = {"borrow": "currentVariableBorrowRate", "supply": "currentLiquidityRate"}
+ROLLING_WINDOWS_HOURS = (24, 7 * 24, 30 * 24)
+PERCENTILES = (10, 50, 90)
+
+INDEX_META_FILE = "index.json"
+STALE_AFTER = HOUR  # percentile lookups further than this past the last indexed hour return None
+
+
+def _pct_key(side: str, window_hours: int, q: int) -> str:
+    return f"{side}_p{q}_{window_hours}h"
+
+
+def _parse_history(token: str, rate_history: List[dict]) -> List[Tuple[int, float, float]]:
+    """Extract (hour_ts, borrow_apr, supply_apr) from raw interestRateHistory entries.
+
+    Entries are sorted by timestamp (the API order is not relied on) and floored to the hour; if several
+    samples fall into the same hour the latest one wins. Each side is parsed independently; a side
+    missing from a sample is NaN and gets forward-filled.
+    """
+    token_cs = to_checksum_address(token)
+    entries = [e for e in rate_history if isinstance(e, dict) and e.get("timestamp") is not None]
+    entries.sort(key=lambda e: e["timestamp"])
+    by_hour: Dict[int, List[float]] = {}
+    for entry in entries:
+        ts_ms = entry["timestamp"]
+        pool = entry.get(token_cs)
+        if not isinstance(pool, dict):
+            continue
+        hour = int(ts_ms // 1000) // HOUR * HOUR
+        for k, side in enumerate(SIDES):
+            v = pool.get(RATE_FIELDS[side])
+            if v is None:
+                continue
+            by_hour.setdefault(hour, [float("nan")] * len(SIDES))[k] = ray_to_percent(str(v)) / 100.0
+    return [(h, v[0], v[1]) for h, v in sorted(by_hour.items())]
+
+
+def _rolling_percentile(rates: np.ndarray, window_hours: int, q: int) -> np.ndarray:
+    """Rolling q-th percentile over the trailing window_hours (partial windows at the start), float32."""
+    roll = pd.Series(rates.astype(np.float64)).rolling(window_hours, min_periods=1)
+    return roll.quantile(q / 100.0).to_numpy().astype(np.float32)
+
+
+def _reserve_flags(reserve: dict) -> Tuple[bool, bool]:
+    """(borrowable, suppliable) from a /data/markets reserve; missing flags count as enabled."""
+    usable = bool(reserve.get("isActive", True)) and not reserve.get("isFrozen") and not reserve.get("isPaused")
+    return usable and bool(reserve.get("borrowingEnabled", True)), usable
+
+
+def _bucket_integrals(cum: np.ndarray, start: int, observed: Optional[int], period: int,
+                      offset: int = 0) -> Tuple[int, np.ndarray]:
+    """Integral of the rate over each calendar bucket [k*period+offset, (k+1)*period+offset).
+
+    Buckets are clipped to the covered range [start, start + n*HOUR]; buckets ending before the side was
+    first observed are NaN. Returns (first_bucket_start, values).
+    """
+    n = len(cum) - 1
+    if n <= 0:
+        return start, np.zeros(0, dtype=np.float64)
+    end = start + n * HOUR
+    first = (start - offset) // period * period + offset
+    last = (end - 1 - offset) // period * period + offset
+    bounds = np.arange(first, last + period + 1, period, dtype=np.int64)
+    idx = (np.clip(bounds, start, end) - start) // HOUR
+    values = np.diff(cum[idx])
+    if observed is None:
+        values[:] = np.nan
+    else:
+        values[bounds[1:] <= observed] = np.nan
+    return first, values
+
+
+@dataclass
+class ReserveSeries:
+    """Hourly borrow/supply rate history of one reserve, stored column-wise on a regular grid.
+
+    Hour i covers [start + i*HOUR, start + (i+1)*HOUR). Samples are floored to the hour (latest one in an
+    hour wins) and gaps are forward-filled, so this is an hour-aligned approximation of
+    loan.build_rate_curve: results differ slightly when raw samples are not on the hour.
+    Hours before a side is first observed stay NaN and are excluded from every query on that side.
+
+      - rates[side][i]: APR (fraction) in hour i, float32
+      - first[side]:    index of the first observed hour (None if never observed), derived from rates
+      - cum[side][i]:   integral of the per-second rate from start to start + i*HOUR (length n+1),
+                        so any interval integral or mean is an O(1) difference
+      - pct[key][i]:    rolling percentile of the APR over the window ending at hour i
+      - daily/weekly:   integral per UTC day / Monday-aligned week, starting at day0/week0
+
+    borrowable/suppliable are the reserve flags from /data/markets at the last update.
+    """
+    reserve: str
+    name: str
+    start: int
+    borrowable: bool = True
+    suppliable: bool = True
+    rates: Dict[str, np.ndarray] = field(default_factory=dict)
+    first: Dict[str, Optional[int]] = field(default_factory=dict)
+    cum: Dict[str, np.ndarray] = field(default_factory=dict)
+    pct: Dict[str, np.ndarray] = field(default_factory=dict)
+    day0: int = 0
+    daily: Dict[str, np.ndarray] = field(default_factory=dict)
+    week0: int = 0
+    weekly: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @property
+    def n(self) -> int:
+        return len(self.rates.get("borrow", ()))
+
+    @property
+    def end(self) -> int:
+        """Timestamp (sec) at which the last indexed hour ends."""
+        return self.start + self.n * HOUR
+
+    def observed_start(self, side: str = "borrow") -> Optional[int]:
+        """Timestamp (sec) of the first hour with an observed rate for side, None if never observed."""
+        f = self.first.get(side)
+        return None if f is None else self.start + f * HOUR
+
+    def _set_first(self, side: str, offset: int = 0) -> None:
+        if self.first.get(side) is not None:
+            return
+        seen = ~np.isnan(self.rates[side][offset:])
+        self.first[side] = offset + int(np.argmax(seen)) if seen.any() else None
+
+    def append(self, points: List[Tuple[int, float, float]]) -> int:
+        """Append hourly points newer than the last indexed hour and refresh derived columns.
+
+        Only the tail of the rolling percentiles is recomputed. Returns the number of hours added.
+        """
+        n_old = self.n
+        if n_old:
+            points = [p for p in points if p[0] >= self.end]
+        if not points:
+            return 0
+        if not n_old:
+            self.start = points[0][0]
+        n_new = (points[-1][0] - self.end) // HOUR + 1
+        idx = np.array([(p[0] - self.end) // HOUR for p in points], dtype=np.int64)
+
+        for k, side in enumerate(SIDES):
+            new = np.full(n_new, np.nan, dtype=np.float64)
+            new[idx] = [p[1 + k] for p in points]
+            if n_old and np.isnan(new[0]):
+                new[0] = self.rates[side][-1]
+            # forward-fill only: hours before the first observation stay NaN (never a made-up 0%)
+            new = pd.Series(new).ffill().to_numpy()
+            old_rates = self.rates.get(side, np.zeros(0, dtype=np.float32))
+            rates = np.concatenate([old_rates, new.astype(np.float32)])
+            self.rates[side] = rates
+            self._set_first(side, n_old)
+
+            old_cum = self.cum.get(side, np.zeros(1, dtype=np.float64))
+            step = np.nan_to_num(rates[n_old:].astype(np.float64)) * (HOUR / SECONDS_PER_YEAR)
+            self.cum[side] = np.concatenate([old_cum, old_cum[-1] + np.cumsum(step)])
+
+            for w in ROLLING_WINDOWS_HOURS:
+                lo = max(0, n_old - (w - 1))
+                for q in PERCENTILES:
+                    key = _pct_key(side, w, q)
+                    fresh = _rolling_percentile(rates[lo:], w, q)[n_old - lo:]
+                    self.pct[key] = np.concatenate([self.pct.get(key, np.zeros(0, dtype=np.float32)), fresh])
+
+            observed = self.observed_start(side)
+            self.day0, self.daily[side] = _bucket_integrals(self.cum[side], self.start, observed, DAY)
+            self.week0, self.weekly[side] = _bucket_integrals(self.cum[side], self.start, observed,
+                                                              WEEK, WEEK_OFFSET)
+        return n_new
+
+    def integral_at(self, ts: int, side: str = "borrow") -> float:
+        """Integral of the per-second rate from start up to ts (O(1)).
+
+        Before the first observed hour the first observed rate is extrapolated backwards, after the
+        last hour the last rate is carried forward, as in loan._integral_at. NaN if side was never observed.
+        """
+        n = self.n
+        if not n:
+            return 0.0
+        f = self.first.get(side)
+        if f is None:
+            return float("nan")
+        r = self.rates[side]
+        cum = self.cum[side]
+        observed = self.start + f * HOUR
+        if ts < observed:
+            return float(cum[f]) + float(r[f]) / SECONDS_PER_YEAR * (ts - observed)
+        i = min(int((ts - self.start) // HOUR), n - 1)
+        return float(cum[i]) + float(r[i]) / SECONDS_PER_YEAR * (ts - self.start - i * HOUR)
+
+    def integral(self, t0: int, t1: int, side: str = "borrow") -> float:
+        if t1 <= t0:
+            return 0.0
+        return self.integral_at(t1, side) - self.integral_at(t0, side)
+
+    def mean_apr(self, t0: int, t1: int, side: str = "borrow") -> Optional[float]:
+        """Time-weighted mean APR (percent) over the part of [t0, t1] with observed data (O(1))."""
+        observed = self.observed_start(side)
+        if observed is None:
+            return None
+        lo = max(t0, observed)
+        hi = min(t1, self.end)
+        if hi <= lo:
+            return None
+        return self.integral(lo, hi, side) / (hi - lo) * SECONDS_PER_YEAR * 100
+
+    def percentile(self, q: int, window_hours: int, at: Optional[int] = None, side: str = "borrow") -> Optional[float]:
+        """Precomputed rolling percentile (APR percent) of the window ending at the hour containing `at`.
+
+        None when `at` lies before the side was first observed, or more than STALE_AFTER past the last
+        indexed hour (a stale index cannot describe a window ending at `at`).
+        """
+        key = _pct_key(side, window_hours, q)
+        if key not in self.pct:
+            raise ValueError(f"percentile p{q} over {window_hours}h is not precomputed "
+                             f"(windows={ROLLING_WINDOWS_HOURS}, percentiles={PERCENTILES})")
+        if not self.n:
+            return None
+        observed = self.observed_start(side)
+        ts = self.end - 1 if at is None else at
+        if observed is None or ts < observed or ts >= self.end + STALE_AFTER:
+            return None
+        v = float(self.pct[key][min(int((ts - self.start) // HOUR), self.n - 1)])
+        return None if np.isnan(v) else v * 100
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays: Dict[str, np.ndarray] = {
+            "start": np.array(self.start, dtype=np.int64),
+            "day0": np.array(self.day0, dtype=np.int64),
+            "week0": np.array(self.week0, dtype=np.int64),
+        }
+        for side in SIDES:
+            arrays[side] = self.rates[side]
+            arrays[f"{side}_cum"] = self.cum[side]
+            arrays[f"{side}_daily"] = self.daily[side]
+            arrays[f"{side}_weekly"] = self.weekly[side]
+        arrays.update(self.pct)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, reserve: str, info: dict, arrays) -> "ReserveSeries":
+        s = cls(reserve=reserve, name=info.get("name", reserve), start=int(arrays["start"]),
+                borrowable=info.get("borrowable", True), suppliable=info.get("suppliable", True),
+                day0=int(arrays["day0"]), week0=int(arrays["week0"]))
+        for side in SIDES:
+            s.rates[side] = arrays[side]
+            s.cum[side] = arrays[f"{side}_cum"]
+            s.daily[side] = arrays[f"{side}_daily"]
+            s.weekly[side] = arrays[f"{side}_weekly"]
+            s._set_first(side)
+            # columns missing from (or truncated in) an older file are rebuilt so they stay aligned with rates
+            for w in ROLLING_WINDOWS_HOURS:
+                for q in PERCENTILES:
+                    key = _pct_key(side, w, q)
+                    col = arrays.get(key)
+                    if col is None or len(col) != len(s.rates[side]):
+                        col = _rolling_percentile(s.rates[side], w, q)
+                    s.pct[key] = col
+        return s
+
+
+class RateIndex:
+    """Market-wide hourly rate index persisted as one .npz per reserve plus an index.json manifest.
+
+    Queries never touch the API: interval integrals and means are O(1) per reserve, rolling
+    percentiles and daily/weekly integrals are precomputed lookups.
+    """
+
+    def __init__(self, path: str, chain: str = "hyperEvm"):
+        self.path = path
+        self.chain = chain
+        self.updated_at: Optional[int] = None
+        self.series: Dict[str, ReserveSeries] = {}
+
+    @classmethod
+    def load(cls, path: str, chain: str = "hyperEvm") -> "RateIndex":
+        """Load an index from disk; returns an empty index if none exists yet."""
+        idx = cls(path, chain)
+        meta_path = os.path.join(path, INDEX_META_FILE)
+        if not os.path.exists(meta_path):
+            return idx
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("chain", chain) != chain:
+            raise ValueError(f"index at {path} was built for chain {meta.get('chain')!r}, not {chain!r}")
+        idx.updated_at = meta.get("updated_at")
+        for reserve, info in meta.get("reserves", {}).items():
+            with np.load(os.path.join(path, f"{reserve}.npz")) as arrays:
+                idx.series[reserve] = ReserveSeries.from_arrays(reserve, info, dict(arrays))
+        return idx
+
+    def save(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        for reserve, s in self.series.items():
+            if not s.n:
+                continue
+            tmp = os.path.join(self.path, f"{reserve}.tmp.npz")
+            np.savez_compressed(tmp, **s.to_arrays())
+            os.replace(tmp, os.path.join(self.path, f"{reserve}.npz"))
+        meta = {
+            "chain": self.chain,
+            "updated_at": self.updated_at,
+            "reserves": {r: {"name": s.name, "start": s.start, "hours": s.n,
+                             "borrowable": s.borrowable, "suppliable": s.suppliable}
+                         for r, s in self.series.items() if s.n},
+        }
+        tmp = os.path.join(self.path, INDEX_META_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, INDEX_META_FILE))
+
+    def update_reserve(self, reserve: str, name: str, rate_history: List[dict],
+                       borrowable: bool = True, suppliable: bool = True) -> int:
+        """Merge raw interestRateHistory entries for one reserve. Returns the number of hours added.
+
+        A reserve is only registered once it has at least one parsed hour.
+        """
+        reserve_cs = to_checksum_address(reserve)
+        s = self.series.get(reserve_cs) or ReserveSeries(reserve=reserve_cs, name=name, start=0)
+        s.name = name
+        s.borrowable = borrowable
+        s.suppliable = suppliable
+        added = s.append(_parse_history(reserve_cs, rate_history))
+        if s.n:
+            self.series[reserve_cs] = s
+        return added
+
+    def update(self, base_url: Optional[str] = None) -> Dict[str, int]:
+        """Fetch all reserves from /data/markets and append any new hourly rates, then persist.
+
+        A reserve whose history fetch fails or returns a malformed payload is reported on stderr and
+        skipped; the others are still saved.
+        """
+        base = base_url or _base_url()
+        added: Dict[str, int] = {}
+        for market in fetch_markets_reserves(self.chain, base):
+            ua = market.get("underlyingAsset")
+            if not ua:
+                continue
+            reserve = to_checksum_address(ua)
+            name = str(market.get("symbol") or market.get("name") or reserve)
+            borrowable, suppliable = _reserve_flags(market)
+            try:
+                hist = fetch_interest_rate_history(self.chain, reserve, base)
+                if not isinstance(hist, list):
+                    raise ValueError(f"unexpected interestRateHistory payload: {str(hist)[:200]}")
+                added[reserve] = self.update_reserve(reserve, name, hist, borrowable, suppliable)
+            except (requests.RequestException, ValueError, TypeError, ArithmeticError) as e:
+                # ArithmeticError covers decimal.InvalidOperation from malformed ray strings
+                print(f"Warning: skipping {name} ({reserve}): {e}", file=sys.stderr)
+        self.updated_at = int(time.time())
+        self.save()
+        return added
+
+    def _get(self, reserve: str) -> ReserveSeries:
+        reserve_cs = to_checksum_address(reserve)
+        s = self.series.get(reserve_cs)
+        if s is None:
+            raise KeyError(f"reserve {reserve_cs} is not in the index")
+        return s
+
+    def interest(self, reserve: str, principal: float, t0: int, t1: int, side: str = "borrow") -> float:
+        """Simple interest on principal from t0 to t1 (sec) on the hour-floored rate grid.
+
+        Approximates loan.accrue_interest; the two differ slightly when raw samples are not on the hour.
+        """
+        if principal <= 0:
+            return 0.0
+        return principal * self._get(reserve).integral(t0, t1, side)
+
+    def percentile(self, reserve: str, q: int, window_hours: int, at: Optional[int] = None,
+                   side: str = "borrow") -> Optional[float]:
+        return self._get(reserve).percentile(q, window_hours, at, side)
+
+    def daily_interest(self, reserve: str, principal: float = 1.0, side: str = "borrow") -> pd.DataFrame:
+        """Interest per UTC day on a constant principal (replaces the notebook's hourly groupby)."""
+        s = self._get(reserve)
+        return _buckets_frame(s.day0, DAY, principal * s.daily[side], "date", "daily_interest")
+
+    def weekly_interest(self, reserve: str, principal: float = 1.0, side: str = "borrow") -> pd.DataFrame:
+        """Interest per Monday-aligned UTC week on a constant principal."""
+        s = self._get(reserve)
+        return _buckets_frame(s.week0, WEEK, principal * s.weekly[side], "week", "weekly_interest")
+
+    def rank(self, side: str = "borrow", days: float = 30, as_of: Optional[int] = None,
+             min_coverage: float = 0.9, include_disabled: bool = False) -> pd.DataFrame:
+        """Rank reserves by mean APR over the last `days` (cheapest first for borrow, best first for supply).
+
+        Reserves whose data covers less than `min_coverage` of the window are dropped, as are reserves
+        with the side disabled (borrowing off, frozen, paused, inactive) unless include_disabled is set.
+        Percentile columns are None when the reserve's data ends before `as_of` (see percentile).
+        """
+        if as_of is None:
+            as_of = int(time.time())
+        t0 = as_of - int(days * DAY)
+        window_hours = int(days * 24)
+        rows = []
+        for r, s in self.series.items():
+            enabled = s.borrowable if side == "borrow" else s.suppliable
+            if not enabled and not include_disabled:
+                continue
+            mean = s.mean_apr(t0, as_of, side)
+            if mean is None:
+                continue
+            coverage_hours = (min(as_of, s.end) - max(t0, s.observed_start(side))) / HOUR
+            if coverage_hours < min_coverage * days * 24:
+                continue
+            row = {
+                "reserve": r,
+                "name": s.name,
+                "mean_apr": mean,
+                "coverage_hours": coverage_hours,
+                "enabled": enabled,
+            }
+            if window_hours in ROLLING_WINDOWS_HOURS:
+                for q in PERCENTILES:
+                    row[f"p{q}_apr"] = s.percentile(q, window_hours, as_of, side)
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            df = df.sort_values("mean_apr", ascending=(side == "borrow")).reset_index(drop=True)
+        return df
+
+    def cheapest_to_borrow(self, days: float = 30, as_of: Optional[int] = None,
+                           min_coverage: float = 0.9) -> Optional[dict]:
+        df = self.rank("borrow", days, as_of, min_coverage)
+        return None if df.empty else df.iloc[0].to_dict()
+
+
+def _buckets_frame(first: int, period: int, values: np.ndarray, label: str, value_col: str) -> pd.DataFrame:
+    starts = first + period * np.arange(len(values), dtype=np.int64)
+    return pd.DataFrame({label: pd.to_datetime(starts, unit="s"), value_col: values})
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Hyperlend market-wide borrow/supply rate index")
+    p.add_argument("--chain", default=os.getenv("HYPERLEND_CHAIN", "hyperEvm"), help="Chain (default: hyperEvm)")
+    p.add_argument("--base-url", default=os.getenv("HYPERLEND_BASE_URL", "https://api.hyperlend.finance"))
+    p.add_argument("--index-dir", default=os.getenv("HYPERLEND_RATE_INDEX", "rate_index"),
+                   help="Directory holding the persisted index (default: rate_index)")
+    p.add_argument("--days", type=float, default=30, help="Ranking window in days (default: 30)")
+    p.add_argument("--min-coverage", type=float, default=0.9,
+                   help="Minimum fraction of the window a reserve must cover to be ranked (default: 0.9)")
+    p.add_argument("--no-update", action="store_true", help="Query the stored index without fetching new rates")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    try:
+        index = RateIndex.load(args.index_dir, args.chain)
+        if not args.no_update:
+            added = index.update(args.base_url)
+            print(f"Indexed {sum(added.values())} new hourly samples across {len(added)} reserves into {args.index_dir}")
+    except requests.HTTPError as e:
+        print(f"HTTP error: {e}", file=sys.stderr)
+        return 3
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    for side, title in (("borrow", "Cheapest to borrow"), ("supply", "Best to supply")):
+        print(f"=== {title} (last {args.days:g} days, APR %) ===")
+        df = index.rank(side, args.days, min_coverage=args.min_coverage)
+        print(df.to_string(index=False) if not df.empty else "(no reserves)")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,216 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+import requests
+
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+import hyperlend.rate_index as rate_index
+from hyperlend.rate_index import HOUR, RateIndex, _parse_history
+
+TOKEN = "0xb88339CB7199b77E23DB6E890353E22632Ba630f"
+OTHER = "0x5555555555555555555555555555555555555555"
+THIRD = "0x6666666666666666666666666666666666666666"
+START = 1_700_000_000 // HOUR * HOUR
+
+
+def _entry(ts, token, borrow=None, supply=None):
+    """One interestRateHistory entry; rates given as APR percent."""
+    pool = {}
+    if borrow is not None:
+        pool["currentVariableBorrowRate"] = str(int(borrow * 10 ** 25))
+    if supply is not None:
+        pool["currentLiquidityRate"] = str(int(supply * 10 ** 25))
+    return {"timestamp": ts * 1000, token: pool}
+
+
+def _history(n_hours, skip=(), token=TOKEN):
+    rng = random.Random(0)
+    out = []
+    for i in range(n_hours):
+        if i in skip:
+            continue
+        apr = rng.uniform(2, 10)
+        out.append(_entry(START + i * HOUR, token, borrow=apr, supply=apr * 0.7))
+    return out
+
+
+def _flat(token, borrow, supply, hours, first_hour=0):
+    return [_entry(START + i * HOUR, token, borrow, supply) for i in range(first_hour, first_hour + hours)]
+
+
+def _assert_same_columns(got, expected):
+    assert set(got) == set(expected)
+    for key, col in expected.items():
+        assert np.allclose(got[key], col, equal_nan=True), key
+
+
+def test_batched_append_matches_full_build_and_round_trips(tmp_path):
+    hist = _history(2000, skip={5, 6, 100, 1300})
+
+    full = RateIndex(str(tmp_path / "full"))
+    full.update_reserve(TOKEN, "USDC", hist)
+
+    inc = RateIndex(str(tmp_path / "inc"))
+    for cut in (1, 700, 1250, len(hist)):
+        inc.update_reserve(TOKEN, "USDC", hist[:cut])
+        inc.save()
+        inc = RateIndex.load(inc.path)
+
+    _assert_same_columns(inc.series[TOKEN].to_arrays(), full.series[TOKEN].to_arrays())
+
+    assert inc.series[TOKEN].n == 2000
+    t0, t1 = START + 1234.5, START + 1500 * HOUR + 0.25
+    assert np.isclose(inc.interest(TOKEN, 1e4, t0, t1), full.interest(TOKEN, 1e4, t0, t1))
+    assert inc.percentile(TOKEN, 90, 720, at=float(t1)) is not None
+    assert np.isclose(inc.daily_interest(TOKEN)["daily_interest"].sum(),
+                      inc.series[TOKEN].integral(START, inc.series[TOKEN].end))
+
+
+def test_side_missing_from_history_is_not_zero(tmp_path):
+    # borrow rate only shows up from hour 100; supply is there from the start
+    hist = [_entry(START + i * HOUR, TOKEN, supply=3) for i in range(100)]
+    hist += [_entry(START + i * HOUR, TOKEN, borrow=8, supply=3) for i in range(100, 800)]
+
+    full = RateIndex(str(tmp_path / "full"))
+    full.update_reserve(TOKEN, "A", hist)
+    inc = RateIndex(str(tmp_path / "inc"))
+    inc.update_reserve(TOKEN, "A", hist[:50])
+    inc.update_reserve(TOKEN, "A", hist)
+    _assert_same_columns(inc.series[TOKEN].to_arrays(), full.series[TOKEN].to_arrays())
+
+    s = inc.series[TOKEN]
+    assert s.observed_start("borrow") == START + 100 * HOUR
+    assert s.observed_start("supply") == START
+    assert np.isnan(s.rates["borrow"][:100]).all()
+    assert s.percentile(50, 24, at=START + 50 * HOUR) is None
+    assert np.isclose(s.mean_apr(START, START + 800 * HOUR), 8.0)
+    assert inc.daily_interest(TOKEN)["daily_interest"].iloc[0] != 0.0
+
+    inc.update_reserve(OTHER, "B", _flat(OTHER, 5, 2, 800))
+    ranked = inc.rank("borrow", 30, as_of=START + 800 * HOUR, min_coverage=0)
+    assert list(ranked["name"]) == ["B", "A"]
+
+
+def test_never_observed_side_is_excluded(tmp_path):
+    idx = RateIndex(str(tmp_path))
+    idx.update_reserve(TOKEN, "A", [_entry(START + i * HOUR, TOKEN, supply=3) for i in range(800)])
+    assert idx.series[TOKEN].observed_start("borrow") is None
+    assert idx.rank("borrow", 30, as_of=START + 800 * HOUR, min_coverage=0).empty
+    assert idx.cheapest_to_borrow(30, as_of=START + 800 * HOUR, min_coverage=0) is None
+
+
+def test_latest_sample_in_hour_wins_regardless_of_order():
+    hist = [
+        _entry(START + 1800, TOKEN, borrow=9),
+        _entry(START, TOKEN, borrow=2),
+        _entry(START + HOUR + 60, TOKEN, borrow=4),
+    ]
+    points = _parse_history(TOKEN, hist)
+    assert [p[0] for p in points] == [START, START + HOUR]
+    assert np.isclose(points[0][1], 0.09)
+    assert np.isclose(points[1][1], 0.04)
+
+
+def test_rank_ordering_and_min_coverage(tmp_path):
+    idx = RateIndex(str(tmp_path))
+    idx.update_reserve(TOKEN, "A", _flat(TOKEN, 6, 4, 800))
+    idx.update_reserve(OTHER, "B", _flat(OTHER, 3, 1, 800))
+    # cheapest borrow but only the last 10 hours of the window
+    idx.update_reserve(THIRD, "C", _flat(THIRD, 1, 9, 10, first_hour=790))
+    as_of = START + 800 * HOUR
+
+    borrow = idx.rank("borrow", 30, as_of=as_of)
+    assert list(borrow["name"]) == ["B", "A"]
+    assert idx.cheapest_to_borrow(30, as_of=as_of)["name"] == "B"
+    assert list(idx.rank("supply", 30, as_of=as_of)["name"]) == ["A", "B"]
+
+    everything = idx.rank("borrow", 30, as_of=as_of, min_coverage=0)
+    assert list(everything["name"]) == ["C", "B", "A"]
+    assert everything.loc[everything["name"] == "C", "coverage_hours"].item() == 10
+
+
+def test_stale_index_has_no_percentiles(tmp_path):
+    idx = RateIndex(str(tmp_path))
+    idx.update_reserve(TOKEN, "A", _flat(TOKEN, 6, 4, 800))
+    end = idx.series[TOKEN].end
+    assert idx.percentile(TOKEN, 50, 720, at=end + 10) is not None
+    assert idx.percentile(TOKEN, 50, 720, at=end + 5 * HOUR) is None
+    ranked = idx.rank("borrow", 30, as_of=end + 5 * HOUR)
+    assert ranked["p50_apr"].isna().all()
+
+
+def test_update_skips_disabled_and_failing_reserves(tmp_path, monkeypatch):
+    bad_ray = "0x7777777777777777777777777777777777777777"
+    broken = "0x8888888888888888888888888888888888888888"
+    down = "0x9999999999999999999999999999999999999999"
+    markets = [
+        {"underlyingAsset": TOKEN, "symbol": "A"},
+        {"underlyingAsset": OTHER, "symbol": "B", "borrowingEnabled": False},
+        {"underlyingAsset": THIRD, "symbol": "C", "isFrozen": True},
+        {"underlyingAsset": bad_ray, "symbol": "D"},
+        {"underlyingAsset": broken, "symbol": "E"},
+        {"underlyingAsset": down, "symbol": "F"},
+    ]
+
+    def fake_history(chain, token, base_url=None):
+        if token == down:
+            raise requests.HTTPError("500 Server Error")
+        if token == broken:
+            return {"error": "rate limited"}
+        if token == bad_ray:
+            return [{"timestamp": START * 1000, bad_ray: {"currentVariableBorrowRate": "nope"}}]
+        borrow = {TOKEN: 6, OTHER: 0, THIRD: 1}[token]
+        return _flat(token, borrow, 2, 800)
+
+    monkeypatch.setattr(rate_index, "fetch_markets_reserves", lambda chain, base_url=None: markets)
+    monkeypatch.setattr(rate_index, "fetch_interest_rate_history", fake_history)
+
+    added = RateIndex(str(tmp_path)).update("http://test")
+    assert set(added) == {TOKEN, OTHER, THIRD}
+
+    idx = RateIndex.load(str(tmp_path))
+    assert set(idx.series) == {TOKEN, OTHER, THIRD}
+    assert (idx.series[OTHER].borrowable, idx.series[OTHER].suppliable) == (False, True)
+    assert (idx.series[THIRD].borrowable, idx.series[THIRD].suppliable) == (False, False)
+
+    as_of = START + 800 * HOUR
+    assert list(idx.rank("borrow", 30, as_of=as_of)["name"]) == ["A"]
+    assert list(idx.rank("supply", 30, as_of=as_of)["name"]) == ["A", "B"]
+    assert list(idx.rank("borrow", 30, as_of=as_of, include_disabled=True)["name"]) == ["B", "C", "A"]
+
+
+def test_missing_percentile_columns_are_rebuilt_on_load(tmp_path):
+    idx = RateIndex(str(tmp_path))
+    idx.update_reserve(TOKEN, "A", _history(900))
+    idx.save()
+    expected = idx.series[TOKEN].to_arrays()
+
+    path = tmp_path / f"{TOKEN}.npz"
+    with np.load(path) as f:
+        arrays = dict(f)
+    del arrays["borrow_p90_720h"]
+    arrays["supply_p50_24h"] = arrays["supply_p50_24h"][:10]
+    np.savez_compressed(path, **arrays)
+
+    loaded = RateIndex.load(str(tmp_path))
+    _assert_same_columns(loaded.series[TOKEN].to_arrays(), expected)
+
+    loaded.update_reserve(TOKEN, "A", _history(1000))
+    assert len(loaded.series[TOKEN].pct["borrow_p90_720h"]) == loaded.series[TOKEN].n == 1000
+
+
+def test_weekly_buckets_start_on_monday(tmp_path):
+    idx = RateIndex(str(tmp_path))
+    idx.update_reserve(TOKEN, "A", _flat(TOKEN, 5, 2, 24 * 20))
+    weekly = idx.weekly_interest(TOKEN, 1.0)
+    assert (weekly["week"].dt.dayofweek == 0).all()
+    assert (weekly["week"] == weekly["week"].dt.normalize()).all()
+    assert weekly["week"].iloc[0] <= pd.to_datetime(START, unit="s") < weekly["week"].iloc[1]
+    assert np.isclose(weekly["weekly_interest"].iloc[1], 0.05 * 7 / 365)
+    assert np.isclose(weekly["weekly_interest"].sum(), idx.daily_interest(TOKEN)["daily_interest"].sum())